@@ -37,6 +37,9 @@
 #   -p, --pattern=[MAC_ADDR] specify MAC address pattern to be matched
 #                            ex. -p \"b8:27:eb:[a-f0-9:]*\"
 #
+#   -n, --threads=[NUM]      number of threads invoking ping command
+#                            (used only if ICMP socket is not available)
+#
 # Examples:
 # finding RaspberryPi on a network interface with 192.168.0.2
 #    $ %s -t raspi -i 192.168.0.2
@@ -60,24 +63,56 @@
 #------------------------------------------------------------
 import sys
 import os
+import stat
+import atexit
 import platform
 import re
 import time
+import errno
+import functools
+import ipaddress
+import socket
+import struct
+import select
 import subprocess
+import tempfile
+import traceback
 from subprocess import Popen, PIPE
-from threading import Thread
-
-# Max thread Pinger agent
-MAX_THREAD = 16
+from threading import Event, BoundedSemaphore
+from queue import Queue, Empty
+from concurrent.futures import ThreadPoolExecutor
+try: # psutil is optional: ifconfig/ipconfig are parsed without it
+    import psutil
+except ImportError:
+    psutil = None
+
+# Max thread Pinger agent (ping is I/O bound: more threads than CPUs)
+MAX_THREAD = max(16, (os.cpu_count() or 1) * 8)
+# Waiting time [s] for echo replies after the last ICMP request
+ICMP_TIMEOUT = 1.0
+# Max waiting time [s] for sending an echo request when buffer is full
+ICMP_SEND_TIMEOUT = 1.0
+# Lifetime [s] of the cached ARP table
+ARP_TABLE_TTL = 2.0
 # If enable debug print, set True
 DEBUG = False
+# Platform name: "Linux", "Darwin", "Windows", etc. (never changes)
+_SYSTEM = platform.system()
+
+# Precompiled patterns for parsing (bytes) outputs of commands
+_RE_IPV4 = re.compile(rb"inet ([0-9]{1,3}(?:\.[0-9]{1,3}){3})")
+_RE_MAC = re.compile(rb"(?:[0-9A-Fa-f]{1,2}[:-]){5}[0-9A-Fa-f]{1,2}")
+_RE_IPV4_ANY = re.compile(rb"(\d+\.){3}\d+")
+_RE_MASK = re.compile(rb"netmask ([0-9]{1,3}(?:\.[0-9]{1,3}){3})")
+_RE_MASK_HEX = re.compile(rb"netmask 0x([0-9a-f]{8})")
+_RE_IPCFG = re.compile(rb"IPv4")
+_RE_TTL = re.compile(rb"ttl|TTL")
 
 # Suppress Tkinter deprecation message
 os.environ["TK_SILENCE_DEPRECATION"] = "1"
 
 # Suppress opening command window on Windows
 if platform.system() == 'Windows':
-    import subprocess
     startupinfo = subprocess.STARTUPINFO()
     startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
     startupinfo.wShowWindow = subprocess.SW_HIDE
@@ -99,29 +134,51 @@ def dprint(msg):
 # popen_args(): stdin/out/err settings for Popen
 #
 # "pyinstaller --noconsole" on Windows requires stdin/out/err
-# strict redirection to avoid OSError
+# strict redirection to avoid OSError. stdin and stderr are
+# redirected to DEVNULL (not pipes) since nobody writes/reads them,
+# unless include_stderr is True.
 #
 # https://github.com/pyinstaller/pyinstaller/wiki/Recipe-subprocess
 #------------------------------------------------------------
-def popen_args(include_stdout = True):
+def popen_args(include_stdout = True, include_stderr = False):
     # The following is true only on Windows.
     if hasattr(subprocess, 'STARTUPINFO'):
         si = subprocess.STARTUPINFO()
         si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
         env = os.environ
+        # console programs get no window without cmd.exe (shell = True)
+        flags = getattr(subprocess, 'CREATE_NO_WINDOW', 0x08000000)
     else:
         si = None
         env = None
+        flags = 0
     if include_stdout: # <= other Popen funcs
         ret = {'stdout': subprocess.PIPE}
     else: # <= Popen.check_output()
         ret = {}
-    ret.update({'stdin': subprocess.PIPE,
-                'stderr': subprocess.PIPE,
+    if include_stderr:
+        ret['stderr'] = subprocess.PIPE
+    else:
+        ret['stderr'] = subprocess.DEVNULL
+    ret.update({'stdin': subprocess.DEVNULL,
                 'startupinfo': si,
+                'creationflags': flags,
                 'env': env })
     return ret
 
+#------------------------------------------------------------
+# launcher_popen_args()
+# Popen arguments for terminal (GUI) applications. The window is
+# shown: STARTUPINFO of popen_args() would hide it (SW_HIDE) on
+# Windows. Nobody reads the output, so stdout is DEVNULL.
+#------------------------------------------------------------
+def launcher_popen_args():
+    ret = popen_args(include_stdout = False)
+    ret.update({'stdout': subprocess.DEVNULL,
+                'startupinfo': None,
+                'creationflags': 0 })
+    return ret
+
 
 #============================================================
 # Getting current network information (IP address)
@@ -131,17 +188,13 @@ def popen_args(include_stdout = True):
 # return: It returns IP address list of current host
 #------------------------------------------------------------
 def get_interfaces_win32():
+    addr_list = []
     try:
-        p = Popen('ipconfig', shell = True, **popen_args())
-        addr_list = []
-        while True:
-            line  = p.stdout.readline()
-            if not line: break
-            m = re.search("IPv4", str(line))
-            if m:
-                m0 = re.search("(\d+\.){3}(\d+)", str(line))
-                if m0: addr_list.append(m0.group())
-        p.wait()
+        with Popen(['ipconfig'], **popen_args()) as p:
+            for line in p.stdout:
+                if _RE_IPCFG.search(line):
+                    m0 = _RE_IPV4_ANY.search(line)
+                    if m0: addr_list.append(m0.group().decode())
     except:
         print("Unexpected error in get_interfaces_win32():",
                 sys.exc_info()[0])
@@ -153,17 +206,15 @@ def get_interfaces_win32():
 # return: It returns IP address list of current host
 #------------------------------------------------------------
 def get_interfaces_unix():
+    addr_list = []
     try:
-        p = Popen('LC_ALL=C ifconfig -a', shell = True, **popen_args())
-        addr_list = []
-        while True:
-            line  = p.stdout.readline()
-            if not line: break
-            m = re.search("inet ([0-9]{1,3}(\.[0-9]{1,3}){3})", str(line))
-            if m and m.group(1) != '127.0.0.1':
-                dprint(m.group(1) + '\n')
-                addr_list.append(m.group(1))
-        p.wait()
+        with Popen('LC_ALL=C ifconfig -a', shell = True, **popen_args()) as p:
+            for line in p.stdout:
+                m = _RE_IPV4.search(line)
+                if m and m.group(1) != b'127.0.0.1':
+                    addr = m.group(1).decode()
+                    dprint(addr + '\n')
+                    addr_list.append(addr)
     except:
         print("Unexpected error in get_interfaces_unix():",
                 sys.exc_info()[0])
@@ -175,31 +226,45 @@ def get_interfaces_unix():
 # return: It returns IP address list of current host
 #------------------------------------------------------------
 def get_interfaces_macos():
+    addr_list = []
     try:
-        p = Popen("LC_ALL='C' ifconfig -a", shell = True, **popen_args())
-        addr_list = []
-        while True:
-            line  = p.stdout.readline()
-            if not line: break
-            m = re.search("inet ([0-9]{1,3}(\.[0-9]{1,3}){3})", str(line))
-            if m and m.group(1) != '127.0.0.1':
-                dprint(m.group(1) + '\n')
-                addr_list.append(m.group(1))
-        p.wait()
+        with Popen("LC_ALL='C' ifconfig -a", shell = True,
+                   **popen_args()) as p:
+            for line in p.stdout:
+                m = _RE_IPV4.search(line)
+                if m and m.group(1) != b'127.0.0.1':
+                    addr = m.group(1).decode()
+                    dprint(addr + '\n')
+                    addr_list.append(addr)
     except:
         print("Unexpected error in get_interfaces_macos():",
                 sys.exc_info()[0])
     dprint("get_interfaces_macos() = " + ' '.join(addr_list) + '\n')
     return addr_list
 
+#------------------------------------------------------------
+# get_interfaces_psutil()
+# return: It returns IP address list of current host
+#------------------------------------------------------------
+def get_interfaces_psutil():
+    addr_list = [a.address for ifname, addrs in psutil.net_if_addrs().items()
+                 for a in addrs
+                 if a.family == socket.AF_INET and a.address != '127.0.0.1']
+    dprint("get_interfaces_psutil() = " + ' '.join(addr_list) + '\n')
+    return addr_list
+
 #------------------------------------------------------------
 # get_interfaces()
 # return: It returns IP address list of current host
+#
+# The result is cached. get_interfaces.cache_clear() makes the next
+# call re-enumerate the interfaces.
 #------------------------------------------------------------
+@functools.lru_cache(maxsize = None)
 def get_interfaces():
-    import os
-    import platform
-    if platform.system() == "Linux":
+    if psutil:
+        return get_interfaces_psutil()
+    elif platform.system() == "Linux":
         return get_interfaces_unix()
     elif platform.system() == "Darwin":
         return get_interfaces_macos()
@@ -223,20 +288,16 @@ def get_interfaces():
 #    "if_gw"  : Gateway of the interface
 #------------------------------------------------------------
 def get_netinfo_win32(ip_addr):
-    p = Popen('ipconfig', **popen_args())
     r = {}
     r["if_addr"] = ip_addr
-    while True:
-        line  = p.stdout.readline()
-        if not line: break
-
-        m = re.search(ip_addr, str(line))
-        if m:
-            m0 = re.search("(\d+\.){3}(\d+)", str(p.stdout.readline()))
-            if m0: r["if_mask"] = m0.group()
-            m1 = re.search("(\d+\.){3}(\d+)", str(p.stdout.readline()))
-            if m1: r["if_gw"]   = m1.group()
-    p.wait()
+    key = ip_addr.encode()
+    with Popen(['ipconfig'], **popen_args()) as p:
+        for line in p.stdout:
+            if key in line:
+                m0 = _RE_IPV4_ANY.search(next(p.stdout, b""))
+                if m0: r["if_mask"] = m0.group().decode()
+                m1 = _RE_IPV4_ANY.search(next(p.stdout, b""))
+                if m1: r["if_gw"]   = m1.group().decode()
     return r
 
 #------------------------------------------------------------
@@ -248,19 +309,16 @@ def get_netinfo_win32(ip_addr):
 #    "if_gw"  : Gateway of the interface
 #------------------------------------------------------------
 def get_netinfo_unix(ip_addr):
-    p = Popen('LC_ALL=C ifconfig -a', shell = True, **popen_args())
     r = {}
     r["if_addr"] = ip_addr
-    while True:
-        line  = p.stdout.readline()
-        if not line: break
-        m = re.search(ip_addr, str(line))
-        if m:
-            m0 = re.search("netmask ([0-9]{1,3}(\.[0-9]{1,3}){3})", str(line))
-            if m0:
-                r["if_mask"] = m0.group(1)
-                dprint("mask: " + m0.group(1) + "\n")
-    p.wait()
+    key = ip_addr.encode()
+    with Popen('LC_ALL=C ifconfig -a', shell = True, **popen_args()) as p:
+        for line in p.stdout:
+            if key in line:
+                m0 = _RE_MASK.search(line)
+                if m0:
+                    r["if_mask"] = m0.group(1).decode()
+                    dprint("mask: " + r["if_mask"] + "\n")
     return r
 
 #------------------------------------------------------------
@@ -272,22 +330,38 @@ def get_netinfo_unix(ip_addr):
 #    "if_gw"  : Gateway of the interface
 #------------------------------------------------------------
 def get_netinfo_macos(ip_addr):
-    p = Popen('LC_ALL=C ifconfig -a', shell = True, **popen_args())
     r = {}
     r["if_addr"] = ip_addr
-    while True:
-        line  = p.stdout.readline()
-        if not line: break
-        m = re.search(ip_addr, str(line))
-        if m:
-            m0 = re.search("netmask 0x([0-9a-f]{8})", str(line))
-            if m0:
-                hexmask = m0.group(1)
-                r["if_mask"]= '.'.join(
-                    [str(int(i,16)) for i in re.split('(..)',hexmask)[1::2]])
-            m1 = re.search("(\d+\.){3}(\d+)", str(p.stdout.readline()))
-            if m1: r["if_gw"]   = m1.group()
-    p.wait()
+    key = ip_addr.encode()
+    with Popen('LC_ALL=C ifconfig -a', shell = True, **popen_args()) as p:
+        for line in p.stdout:
+            if key in line:
+                m0 = _RE_MASK_HEX.search(line)
+                if m0:
+                    hexmask = m0.group(1).decode()
+                    r["if_mask"]= '.'.join(
+                        [str(i) for i in bytes.fromhex(hexmask)])
+                m1 = _RE_IPV4_ANY.search(next(p.stdout, b""))
+                if m1: r["if_gw"]   = m1.group().decode()
+    return r
+
+#------------------------------------------------------------
+# get_netinfo_psutil(ip_addr)
+# ip_addr: An IP address of one of the current host.
+# return : It returns the following dictionary
+#    "if_addr": IP address of the interface. (the given IP address)
+#    "if_mask": Net mask of the interface
+#------------------------------------------------------------
+def get_netinfo_psutil(ip_addr):
+    r = {}
+    r["if_addr"] = ip_addr
+    for ifname, addrs in psutil.net_if_addrs().items():
+        for a in addrs:
+            if a.family == socket.AF_INET and a.address == ip_addr \
+                    and a.netmask:
+                r["if_mask"] = a.netmask
+                dprint("mask: " + r["if_mask"] + "\n")
+                return r
     return r
 
 #------------------------------------------------------------
@@ -297,11 +371,14 @@ def get_netinfo_macos(ip_addr):
 #    "if_addr": IP address of the interface. (the given IP address)
 #    "if_mask": Net mask of the interface
 #    "if_gw"  : Gateway of the interface
+#
+# The result is cached. get_netinfo.cache_clear() clears it.
 #------------------------------------------------------------
+@functools.lru_cache(maxsize = None)
 def get_netinfo(ip_addr):
-    import os
-    import platform
-    if os.name == 'posix':
+    if psutil:
+        return get_netinfo_psutil(ip_addr)
+    elif os.name == 'posix':
         if platform.system() == "Darwin":
             return get_netinfo_macos(ip_addr)
         else:
@@ -323,21 +400,17 @@ def get_netinfo(ip_addr):
 # return  : Number of bit for the given netmask string
 #
 # ex. count_maskbit("255.255.254.0") -> 23
+# ValueError is raised for invalid netmask.
 #------------------------------------------------------------
 def count_maskbit(mask_str):
-    mask = mask_str.split(".")
-    if len(mask) != 4:
-        print("Error: invalid mask", mask_str)
-        sys.exit(1)
-    count = 0
-    bitnum_pre = 8
-    for m in mask:
-        bitnum = bin(int(m)).count('1')
-        if bitnum > bitnum_pre:
-            print("Error: invalid mask", mask_str)
-            sys.exit(1)
-        count = count + bitnum
-        bitnum_pre = bitnum
+    try:
+        mask = struct.unpack("!I", socket.inet_aton(mask_str))[0]
+    except (OSError, TypeError):
+        raise ValueError("invalid mask %s" % (mask_str))
+    count = bin(mask).count("1")
+    # non-contiguous mask like 255.0.255.0 is rejected
+    if mask != (0xFFFFFFFF << (32 - count)) & 0xFFFFFFFF:
+        raise ValueError("invalid mask %s" % (mask_str))
     return count
 
 #------------------------------------------------------------
@@ -361,49 +434,51 @@ def sockaddr_to_hex(addr):
 #          in socket module functions
 #------------------------------------------------------------
 def hex_to_sockaddr(hex_addr):
-    import socket
-    import struct
     a0 = int((hex_addr >> 24) & 0xFF)
     a1 = int((hex_addr >> 16) & 0xFF)
     a2 = int((hex_addr >> 8)  & 0xFF)
     a3 = int((hex_addr >> 0)  & 0xFF)
     return struct.pack("BBBB", a0, a1, a2, a3)
 
+#------------------------------------------------------------
+# get_host_bounds(ip_addr)
+#
+# ip_addr: Dotted IP address expression with netmask bit number
+#          separated by slash "/". ex. 150.29.99.231/24
+# return : (first, last) host addresses of the network by integer
+#          (network and broadcast addresses are excluded)
+#------------------------------------------------------------
+def get_host_bounds(ip_addr):
+    net = ipaddress.ip_network(ip_addr, strict = False)
+    first = int(net.network_address)
+    last = int(net.broadcast_address)
+    if net.prefixlen < 31: # excluding network and broadcast address
+        first, last = first + 1, last - 1
+    return first, last
+
 #------------------------------------------------------------
 # get_addr_range(ip_addr)
 #
-# This function calculates host IP addresses which are included
+# This function generates host IP addresses which are included
 # in the current network from given an IP address with netmask.
+# Addresses are generated from the highest one, block by block, so
+# that the whole list is never held in memory.
 #
 # ip_addr: Dotted IP address expression with netmask bit number
 #          separated by slash "/". ex. 150.29.99.231/24
-# return : IP address list by array
+# return : Generator of host IP addresses (network and broadcast
+#          addresses are excluded)
 #------------------------------------------------------------
 def get_addr_range(ip_addr):
-    import socket
-    import struct
-    r = []
-    ip, mask = ip_addr.split("/")
-    mask = int(mask)
-    h = socket.inet_aton(ip)
-    bin_addr = socket.htonl(struct.unpack("I", h)[0])
-    hex_to_sockaddr(bin_addr)
-    bin_mask = 0b0
-    for i in range(0, 32):
-        if i < mask:
-            bin_mask = (bin_mask << 1) | 0b1
-        else:
-            bin_mask = bin_mask << 1
-    bin_netw = bin_addr & bin_mask
-    for x in range(0, pow(2,(32 - mask))):
-        new_addr = bin_netw | x
-        a0 = int((new_addr >> 24) & 0xFF)
-        a1 = int((new_addr >> 16) & 0xFF)
-        a2 = int((new_addr >> 8)  & 0xFF)
-        a3 = int((new_addr >> 0)  & 0xFF)
-        addr = struct.pack("BBBB", a0, a1, a2, a3)
-        r.append(socket.inet_ntoa(addr))
-    return r
+    first, last = get_host_bounds(ip_addr)
+    top = last
+    while top >= first:
+        # packing 256 addresses at once into 4-bytes records
+        n = min(256, top - first + 1)
+        raw = struct.pack("!%dI" % n, *range(top, top - n, -1))
+        for i in range(0, n * 4, 4):
+            yield socket.inet_ntoa(raw[i:i + 4])
+        top -= n
 #
 #============================================================
 
@@ -412,106 +487,311 @@ def get_addr_range(ip_addr):
 #============================================================
 
 #------------------------------------------------------------
-# get_macaddress_win32()
+# get_arp_table_linux()
+# return: ARP table dictionary {ip: mac} read from /proc/net/arp
+#------------------------------------------------------------
+def get_arp_table_linux():
+    table = {}
+    with open("/proc/net/arp", "rb") as f:
+        next(f, None) # header line
+        for line in f:
+            cols = line.split()
+            # Flags 0x0 means incomplete entry
+            if len(cols) >= 4 and cols[2] != b"0x0":
+                table[cols[0].decode()] = cols[3].decode()
+    return table
+
+#------------------------------------------------------------
+# get_arp_table_cmd(cmd)
+# cmd   : arp command to show all the entries ("arp -a", "arp -an")
+# return: ARP table dictionary {ip: mac}
+#------------------------------------------------------------
+def get_arp_table_cmd(cmd):
+    table = {}
+    with Popen(cmd.split(), **popen_args()) as p:
+        for line in p.stdout:
+            m_ip = _RE_IPV4_ANY.search(line)
+            m_mac = _RE_MAC.search(line)
+            if m_ip and m_mac:
+                # Macaddress's delimiter is '-' on Win arp
+                table[m_ip.group().decode()] = \
+                    m_mac.group().decode().replace("-", ":")
+    return table
+
+#------------------------------------------------------------
+# arp_table(max_age)
+# max_age: The table read within max_age [s] is reused
+# return : ARP table dictionary {ip: mac} of the current host
+#------------------------------------------------------------
+_arp_cache = (0.0, {})
+def arp_table(max_age = ARP_TABLE_TTL):
+    global _arp_cache
+    stamp, table = _arp_cache
+    now = time.time()
+    if now - stamp < max_age:
+        return table
+    if os.path.exists("/proc/net/arp"):
+        table = get_arp_table_linux()
+    elif os.name == 'nt':
+        table = get_arp_table_cmd("arp -a")
+    else:
+        table = get_arp_table_cmd("arp -an")
+    dprint("arp_table(): " + str(len(table)) + " entries\n")
+    _arp_cache = (now, table)
+    return table
+
+#------------------------------------------------------------
+# get_macaddress(host)
+# host  : IP address of the host
+# return: MAC address of the host, or "" if it is not known
+#------------------------------------------------------------
+def get_macaddress(host):
+    mac = arp_table().get(host)
+    if mac == None: # it might be resolved after the table was read
+        mac = arp_table(0).get(host, "")
+    return mac
 #------------------------------------------------------------
-def get_macaddress_win32(host):
-    p = Popen("arp -a " + host, shell = True, **popen_args())
-    while True:
-        line = p.stdout.readline()
-        if not line: break
-        m = re.search("(([0-9A-Fa-f]{1,2}[:-]){5}([0-9A-Fa-f]{1,2}))",
-                    str(line))
-        if m:
-            # Macaddress's delimiter is '-' on Win arp
-            return m.group(0).replace("-", ":")
-    return ""
 
 #------------------------------------------------------------
-# get_macaddress_unix()
+# icmp_checksum(data)
+# data  : ICMP packet bytes whose checksum field is zero
+# return: Internet checksum (RFC 1071) of the given data
 #------------------------------------------------------------
-def get_macaddress_unix(host):
-    p = Popen("arp " + host, shell = True, **popen_args())
-    while True:
-        line = p.stdout.readline()
-        if not line: break
-        m = re.search("(([0-9A-Fa-f]{1,2}[:-]){5}([0-9A-Fa-f]{1,2}))",
-                    str(line))
-        if m:
-            return m.group(0)
-    return ""
+def icmp_checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    s = sum(struct.unpack("!%dH" % (len(data) // 2), data))
+    s = (s >> 16) + (s & 0xFFFF)
+    s += s >> 16
+    return ~s & 0xFFFF
 
-def get_macaddress(host):
-    import os
-    import platform
-    if os.name == 'posix':
-        return get_macaddress_unix(host)
-    elif os.name == 'nt':
-        return get_macaddress_win32(host)
-    else:
-        print("Unsupported OS")
 #------------------------------------------------------------
-    
+# icmp_socket()
+# return: (socket, is_raw)
+#
+# An unprivileged ICMP datagram socket is used if the OS allows it
+# (Linux/MacOS), otherwise a raw socket (root/Administrator) is used.
+# OSError is raised if neither of them is permitted.
+#------------------------------------------------------------
+def icmp_socket():
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM,
+                             socket.IPPROTO_ICMP), False
+    except OSError:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW,
+                             socket.IPPROTO_ICMP), True
 
+#------------------------------------------------------------
+# icmp_receive(sock, wait, ident, bounds, alive)
+# Collects echo replies arriving within "wait" seconds and appends
+# the source addresses within "bounds" ([first, last] addresses
+# swept, as integer) to the "alive" set.
+#------------------------------------------------------------
+def icmp_receive(sock, wait, ident, bounds, alive):
+    readable = select.select([sock], [], [], wait)[0]
+    while readable:
+        try:
+            data, addr = sock.recvfrom(1024)
+        except OSError: # includes BlockingIOError: no more data
+            break
+        # raw socket (and MacOS datagram socket) includes IP header
+        if len(data) >= 20 and data[0] >> 4 == 4:
+            data = data[(data[0] & 0x0F) * 4:]
+        if len(data) < 8 or data[0] != 0: # not an echo reply
+            continue
+        # Linux datagram socket rewrites ident, so check it if known
+        if ident != None and struct.unpack("!H", data[4:6])[0] != ident:
+            continue
+        host = addr[0]
+        addr = struct.unpack("!I", socket.inet_aton(host))[0]
+        if bounds[0] <= addr <= bounds[1] and host not in alive:
+            dprint("echo reply from " + host + "\n")
+            alive.add(host)
+
+#------------------------------------------------------------
+# icmp_send(sock, packet, host, receive)
+# Sends an echo request. When the send buffer is full (burst of
+# requests, EAGAIN/ENOBUFS), it waits for the socket to be writable
+# and retries until ICMP_SEND_TIMEOUT. receive() is called while
+# waiting to pick up replies.
+# return: True if the request is sent
+#------------------------------------------------------------
+def icmp_send(sock, packet, host, receive):
+    deadline = time.time() + ICMP_SEND_TIMEOUT
+    backoff = 0.001
+    while True:
+        try:
+            sock.sendto(packet, (host, 0))
+            return True
+        except OSError as e:
+            full = isinstance(e, BlockingIOError) or e.errno == errno.ENOBUFS
+            remaining = deadline - time.time()
+            if not full or remaining <= 0 or Pinger.aborted.is_set():
+                dprint("echo request to " + host + " failed\n")
+                return False
+            nobufs = e.errno == errno.ENOBUFS
+        if nobufs:
+            # interface queue is full though socket looks writable: back off
+            readable = select.select([sock], [], [], min(remaining, backoff))[0]
+            backoff = min(backoff * 2, 0.05)
+        else:
+            readable = select.select([sock], [sock], [], remaining)[0]
+        if readable: receive()
 
+#------------------------------------------------------------
+# icmp_sweep(hosts, timeout, source)
+#
+# Sends ICMP echo requests to all the given hosts through one socket
+# and then collects echo replies until timeout.
+#
+# hosts  : Host IP address list (ex. ['192.168.0.1', ... ])
+# timeout: Waiting time [s] for replies after the last request
+# source : Local interface address to be bound (optional)
+# return : Aliving hosts list
+#------------------------------------------------------------
+def icmp_sweep(hosts, timeout = ICMP_TIMEOUT, source = None):
+    sock, is_raw = icmp_socket()
+    try:
+        if source: sock.bind((source, 0))
+        sock.setblocking(False)
+        ident = os.getpid() & 0xFFFF
+        payload = b"xfinder" + b"\0" * 25
+        # hosts (generator) are not stored: replies are checked by range
+        bounds = [0xFFFFFFFF, 0]
+        alive = set()
+        for seq, host in enumerate(hosts):
+            if Pinger.aborted.is_set(): break
+            seq &= 0xFFFF
+            header = struct.pack("!BBHHH", 8, 0, 0, ident, seq)
+            chksum = icmp_checksum(header + payload)
+            packet = struct.pack("!BBHHH", 8, 0, chksum, ident, seq) + payload
+            addr = struct.unpack("!I", socket.inet_aton(host))[0]
+            bounds[0] = min(bounds[0], addr)
+            bounds[1] = max(bounds[1], addr)
+            icmp_send(sock, packet, host,
+                      lambda: icmp_receive(sock, 0, is_raw and ident or None,
+                                           bounds, alive))
+            PingAgent.advance()
+            if PingAgent.verbose:
+                sys.stderr.write('.')
+                sys.stderr.flush()
+            # pick up early replies not to overflow receive buffer
+            icmp_receive(sock, 0, is_raw and ident or None, bounds, alive)
+        deadline = time.time() + timeout
+        while not Pinger.aborted.is_set():
+            remaining = deadline - time.time()
+            if remaining <= 0: break
+            icmp_receive(sock, remaining, is_raw and ident or None,
+                         bounds, alive)
+    finally:
+        sock.close()
+    dprint("icmp_sweep() = " + ' '.join(alive) + "\n")
+    return list(alive)
 
 #------------------------------------------------------------
 # @class Pinger class
 # This class pingsto hosts and returns aliving hosts list.
-# PingAgents.wait() waits until finishing ping operation.
+# All hosts are swept by icmp_sweep() at once. If ICMP socket is not
+# available (no privilege), a thread pool invokes ping command.
+# Pinger() returns after finishing ping operation.
 # PingAgent.results includes aliving hosts list.
 # ex.
-# hosts = ['192.168.0.1', '192.168.0.2', ... ]
+# hosts = ['192.168.0.1', '192.168.0.2', ... ]  (or generator)
 # Pinger(hosts)
-# PingAgent.wait()
 # print PingAgent.results
 #------------------------------------------------------------
 class Pinger(object):
-    running = True
-    def __init__(self, hosts, numthreads = MAX_THREAD, pattern = None,
-                 callback = None):
+    aborted = Event()
+    numthreads = MAX_THREAD
+    def __init__(self, hosts, numthreads = 0, pattern = None,
+                 callback = None, source = None):
         PingAgent.reset()
-        if numthreads > MAX_THREAD: numthreads = MAX_THREAD
-        PingAgent.set_max(len(hosts))
-        Pinger.running = True
-        for host in hosts:
-            if not Pinger.running: break
-            pa = PingAgent(host, pattern, callback)
-            pa.start()
-            time.sleep(0.05)
-            if numthreads == 0: continue
-            while len(PingAgent.running) > numthreads:
-                time.sleep(0.1)
+        # max count of hosts generator should be set by caller
+        if hasattr(hosts, "__len__"): PingAgent.set_max(len(hosts))
+        Pinger.aborted.clear()
+        try:
+            alive = icmp_sweep(hosts, source = source)
+        except OSError:
+            dprint("ICMP socket is not available, ping command is used\n")
+            PingAgent.reset()
+            self.ping_agents(hosts, numthreads, pattern, callback)
+            return
+        for host in alive:
+            if Pinger.aborted.is_set(): break
+            PingAgent.found(host, pattern, callback)
+
+    def ping_agents(self, hosts, numthreads, pattern, callback):
+        if numthreads <= 0: numthreads = Pinger.numthreads
+        dprint("ping command with " + str(numthreads) + " threads\n")
+        # hosts are taken from (generator) hosts only when a worker is free
+        self.slots = BoundedSemaphore(numthreads)
+        self.replies = Queue()
+        ex = ThreadPoolExecutor(max_workers = numthreads)
+        try:
+            for host in hosts:
+                if Pinger.aborted.is_set(): break
+                self.slots.acquire()
+                ex.submit(self.ping_one, host)
+                self.drain(pattern, callback)
+        finally:
+            ex.shutdown(wait = True)
+        self.drain(pattern, callback)
+
+    # [worker thread] pinging a host and queuing the (host, alive) reply
+    def ping_one(self, host):
+        alive = False
+        try:
+            alive = PingAgent.ping(host)
+        finally:
+            self.replies.put((host, alive))
+            self.slots.release()
+
+    # processing queued replies in the Pinger's thread
+    def drain(self, pattern, callback):
+        while True:
+            try:
+                host, alive = self.replies.get_nowait()
+            except Empty:
+                return
+            PingAgent.advance()
+            if PingAgent.verbose:
+                sys.stderr.write('.')
+                sys.stderr.flush()
+            if alive and not Pinger.aborted.is_set():
+                PingAgent.found(host, pattern, callback)
+
     @staticmethod
     def abort():
-        Pinger.running = False
+        Pinger.aborted.set()
 
-class PingAgent(Thread):
+    # default number of threads invoking ping command
+    @staticmethod
+    def set_numthreads(numthreads):
+        Pinger.numthreads = numthreads
+
+class PingAgent(object):
     results = {}
-    running = []
     count   = 0
     max_count = 0
     verbose = True
-    def __init__(self, host, pattern = None, callback = None):
-        Thread.__init__(self)
-        self.host = host
-        self.pattern = pattern
-        self.callback = callback
-        PingAgent.running.append(1)
-        PingAgent.count += 1
-        if PingAgent.verbose:
-            sys.stderr.write('.')
-            sys.stderr.flush()
+    progressed = Event() # set whenever count is changed
 
     @staticmethod
     def wait():
-        while len(PingAgent.running) != 0:
-            time.sleep(1)
+        # Pinger() returns after all the hosts are pinged
         return
 
     @staticmethod
     def reset():
         PingAgent.count = 0
         PingAgent.results = {}
+        PingAgent.progressed.set()
+
+    # a host has been pinged
+    @staticmethod
+    def advance():
+        PingAgent.count += 1
+        PingAgent.progressed.set()
 
     @staticmethod
     def set_max(max_count):
@@ -521,50 +801,91 @@ class PingAgent(Thread):
     def verbose(vvv = True):
         PingAgent.verbose = vvv
 
-    def run(self):
-        import platform
-        if platform.system() == 'Linux':
-            p = subprocess.Popen("ping -t 1 -w 1 " +  self.host,
-                                shell = True, ** popen_args())
-            m = re.search("ttl", str(p.stdout.read()))
-            dprint("ping -t 1 -w 1 " +  self.host + "\n")
-            p.wait()
-        elif platform.system() == 'Darwin':
-            p = subprocess.Popen("ping -t 1 -c 1 " +  self.host,
-                                shell = True, ** popen_args())
-            m = re.search("ttl", str(p.stdout.read()))
-            dprint("ping -t 1 -c 1 " +  self.host + "\n")
-            p.wait()
-        elif platform.system() == 'Windows':
-            p = subprocess.Popen("ping -n 1 -w 1000 " + self.host,
-                                shell = True, **popen_args())
-            m = re.search("TTL", str(p.stdout.read()))
-            dprint("ping -n 1" + self.host + "\n")
-            p.wait()
+    # aliving host found: checking MAC address and storing result
+    # pattern: compiled (lower case) regex of MAC address
+    @staticmethod
+    def found(host, pattern = None, callback = None):
+        if pattern:
+            macaddr = get_macaddress(host)
+            dprint("MAC addr: " + macaddr + "\n")
+            pmatch = pattern.match(macaddr.lower())
+            if pmatch:
+                dprint("MAC address matched\n")
+                if callback:
+                    callback(host, macaddr)
+                PingAgent.results[host] = macaddr
+        else:
+            PingAgent.results[host] = ""
+
+    # invoking ping command: returns True if the host is aliving
+    @staticmethod
+    def ping(host):
+        if Pinger.aborted.is_set():
+            return False
+        if _SYSTEM == 'Linux':
+            cmd = "ping -t 1 -w 1 " +  host
+        elif _SYSTEM == 'Darwin':
+            cmd = "ping -t 1 -c 1 " +  host
+        elif _SYSTEM == 'Windows':
+            cmd = "ping -n 1 -w 1000 " + host
         else:
             print("Unsupported OS")
-        if m:
-            if self.pattern:
-                macaddr = get_macaddress(self.host)
-                dprint("MAC addr: " + macaddr + "\n")
-                pmatch = re.match(self.pattern, str(macaddr))
-                if pmatch:
-                    dprint("MAC address matched\n")
-                    if self.callback:
-                        self.callback(self.host, macaddr)
-                    PingAgent.results[self.host] = macaddr
-            else:
-                PingAgent.results[self.host] = ""
-        #finished
-        PingAgent.running.pop()
+            cmd = "ping -c 1 " + host
+        dprint(cmd + "\n")
+        try:
+            if _SYSTEM == 'Windows':
+                # Windows ping exits with 0 for "Destination host unreachable"
+                with Popen(cmd.split(), **popen_args()) as p:
+                    return any(_RE_TTL.search(line) for line in p.stdout)
+            return subprocess.call(cmd.split(), stdout = subprocess.DEVNULL,
+                                   **popen_args(include_stdout = False)) == 0
+        except OSError: # no ping command (exit status 127 by shell before)
+            dprint("ping command cannot be invoked\n")
+            return False
 #
 #------------------------------------------------------------
 
+#------------------------------------------------------------
+# @class MacPrefix class
+# Plain MAC address prefixes which can be used as a compiled pattern,
+# matching by str.startswith() instead of regex.
+# ex. MacPrefix(["b8:27:eb:"]).match("b8:27:eb:01:02:03") -> True
+#------------------------------------------------------------
+class MacPrefix(object):
+    def __init__(self, prefixes):
+        self.prefixes = tuple(prefixes)
+
+    def match(self, mac):
+        return mac.startswith(self.prefixes)
+
+# prefix only pattern: "b8:27:eb:", "b8:27:eb:[a-f0-9:]*", "00:50:56.*"
+_RE_PLAIN_PREFIX = re.compile(r"([0-9a-f:\-]*)(?:\[a-f0-9:\]\*|\.\*)?$")
+
+#------------------------------------------------------------
+# compile_mac_pattern(pattern)
+# pattern: Match pattern of mac address (ex. b8:27:eb:[a-f0-9:]*)
+# return : MacPrefix if the pattern is (alternation of) plain
+#          prefixes, otherwise compiled regex. Both are lower case.
+#          Already compiled pattern (re.Pattern, MacPrefix) is returned as is.
+#------------------------------------------------------------
+def compile_mac_pattern(pattern):
+    if not isinstance(pattern, str):
+        return pattern
+    pattern = pattern.lower()
+    prefixes = []
+    for p in pattern.split("|"):
+        m = _RE_PLAIN_PREFIX.match(p)
+        if not m:
+            return re.compile(pattern)
+        prefixes.append(m.group(1))
+    return MacPrefix(prefixes)
+
 #------------------------------------------------------------
 # get_mac_matched_ip(host_ip, pattern)
 #
 # host_ip: One of the host IP address (ex. 192.168.11.10)
 # pattern: Match pattern of mac address (ex. b8:27:eb:[a-f0-9:]*)
+#          or compiled one by compile_mac_pattern() / re.compile()
 #
 # ex. 
 # RaspberryPi list = get_mac_matched_ip(host_ip, "b8:27:eb:[a-f0-9:]*")
@@ -572,33 +893,88 @@ class PingAgent(Thread):
 #------------------------------------------------------------
 def get_mac_matched_ip(host_ip, pattern, callback = None):
     net_info = get_netinfo(host_ip)
-    mask_bit = count_maskbit(net_info["if_mask"])
+    mask_bit = count_maskbit(net_info.get("if_mask"))
     addr_str = net_info["if_addr"] + "/" + str(mask_bit)
+    first, last = get_host_bounds(addr_str)
+    PingAgent.set_max(last - first + 1)
     addr_range = get_addr_range(addr_str)
-    addr_range.reverse()
-    Pinger(addr_range, 64, pattern, callback)
-    PingAgent.wait()
+    patt = compile_mac_pattern(pattern)
+    Pinger(addr_range, Pinger.numthreads, patt, callback, net_info["if_addr"])
+    return PingAgent.results
+
+#------------------------------------------------------------
+# get_mac_matched_ip_multi(host_ip, patterns)
+# Getting IP list for each of the patterns by one scan
+#
+# host_ip : One of the host IP address (ex. 192.168.11.10)
+# patterns: Match patterns of mac address (duplicates are scanned once)
+# return  : {pattern: {ip: mac}} dictionary
+#------------------------------------------------------------
+def get_mac_matched_ip_multi(host_ip, patterns, callback = None):
+    patterns = list(dict.fromkeys(patterns)) # dedupe keeping order
+    found = get_mac_matched_ip(host_ip, "|".join(patterns), callback)
     result = {}
-    for ip_addr in PingAgent.results.keys():
-        mac_addr = get_macaddress(ip_addr)
-        m = re.match(pattern.lower(), mac_addr.lower())
-        if m:
-            result[ip_addr] = get_macaddress(ip_addr)
+    for p in patterns:
+        patt = compile_mac_pattern(p)
+        result[p] = {ip: mac for ip, mac in found.items()
+                     if patt.match(mac.lower())}
     return result
 
+#------------------------------------------------------------
+# MAC address prefixes (vendor part) of known boards
+#------------------------------------------------------------
+BOARD_MAC_PATTERNS = {
+    "RaspberryPi": "b8:27:eb:",
+    "BeagleBone" : "c8:a0:30:",
+    }
+# One alternation of all the prefixes: group name tells the board
+_RE_BOARDS = re.compile("|".join(
+    ["(?P<%s>%s)" % (name, re.escape(prefix))
+     for name, prefix in BOARD_MAC_PATTERNS.items()]), re.IGNORECASE)
+
+#------------------------------------------------------------
+# classify_macs(macs, names)
+#
+# macs  : {ip: mac} dictionary (ex. arp_table(), PingAgent.results)
+# names : Board names to be classified (default: all the boards)
+# return: {board_name: {ip: mac}} dictionary
+#------------------------------------------------------------
+def classify_macs(macs, names = None):
+    if names == None: names = BOARD_MAC_PATTERNS.keys()
+    boards = {name: {} for name in names}
+    for ip, mac in macs.items():
+        m = _RE_BOARDS.match(mac)
+        if m and m.lastgroup in boards:
+            boards[m.lastgroup][ip] = mac
+    return boards
+
+#------------------------------------------------------------
+# get_boards(host_ip, names)
+# Getting boards list of the given board names by one scan
+#
+# host_ip: One of the host IP address (ex. 192.168.11.10)
+# names  : Board names in BOARD_MAC_PATTERNS (default: all)
+# return : {board_name: {ip: mac}} dictionary
+#------------------------------------------------------------
+def get_boards(host_ip, names = None, callback = None):
+    if names == None: names = list(BOARD_MAC_PATTERNS.keys())
+    pattern = "|".join([re.escape(BOARD_MAC_PATTERNS[n]) for n in names])
+    return classify_macs(get_mac_matched_ip(host_ip, pattern, callback),
+                         names)
+
 #------------------------------------------------------------
 # get_raspberrypis(host_ip)
 # Getting RaspberryPi list
 #------------------------------------------------------------
 def get_raspberrypis(host_ip, callback = None):
-    return get_mac_matched_ip(host_ip, "b8:27:eb:[a-f0-9:]*", callback)
+    return get_boards(host_ip, ["RaspberryPi"], callback)["RaspberryPi"]
 
 #------------------------------------------------------------
 # get_beaglebones(host_ip)
 # Getting BeagleBone list
 #------------------------------------------------------------
 def get_beaglebones(host_ip, callback = None):
-    return get_mac_matched_ip(host_ip, "c8:a0:30:[a-f0-9:]*", callback)
+    return get_boards(host_ip, ["BeagleBone"], callback)["BeagleBone"]
 #
 #------------------------------------------------------------
 
@@ -625,10 +1001,14 @@ Options:
     for n, t in BOARD_TYPES.items():
         print("                      %s:" % (n))
         print("                     ", t[0])
-    htlp_msg = """
+    help_msg = """
   -p, --pattern=[MAC_ADDR] specify MAC address pattern to be matched
                            ex. -p \"b8:27:eb:[a-f0-9:]*\"
 
+  -n, --threads=[NUM]      number of threads invoking ping command
+                           (used only if ICMP socket is not available)
+                           default: %d
+
 Examples:
  finding RaspberryPi on a network interface with 192.168.0.2
     $ %s -t raspi -i 192.168.0.2
@@ -640,7 +1020,7 @@ Examples:
 
  finding VMware virtual host with MAC address 00:50:56.*
     $ %s -p \"00:50:56\"
-""" % (sys.argv[0], sys.argv[0], sys.argv[0])
+""" % (MAX_THREAD, sys.argv[0], sys.argv[0], sys.argv[0])
     print(help_msg)
 
 
@@ -669,6 +1049,13 @@ def check_ifaddr(host_ip, a):
         print(curr_ifip)
         sys.exit(0)
 
+def check_threads(a):
+    if not a.isdigit() or int(a) == 0:
+        print(a, "is not a valid number of threads.")
+        sys.exit(-1)
+    Pinger.set_numthreads(int(a))
+    dprint("number of ping threads: " + a + "\n")
+
 def check_type(board_type, a):
     a = a.lower()
     for name in BOARD_TYPES:
@@ -676,20 +1063,31 @@ def check_type(board_type, a):
                board_type.count(name) == 0:
             board_type.append(name)
 
+#------------------------------------------------------------
+# get_hostname(ip_addr)
+# return: Host name of the given IP address by reverse DNS lookup,
+#         or "" if it is not resolved. Results are cached for rescans.
+#------------------------------------------------------------
+@functools.lru_cache(maxsize = 4096)
+def get_hostname(ip_addr):
+    try:
+        return socket.gethostbyaddr(ip_addr)[0]
+    except (OSError, UnicodeError): # socket.herror, socket.gaierror
+        return ""
+
 def print_boards(boards):
+    # reverse lookups are done in parallel not to wait N x DNS timeout
+    with ThreadPoolExecutor(max_workers = 16) as ex:
+        names = dict(zip(boards, ex.map(get_hostname, boards)))
     for i, m in boards.items():
-        import socket
-        try:
-            host_name = socket.gethostbyaddr(i)[0]
-        except:
-            host_name = ""
-        print("    ", i, "\t", m, "\t", host_name)
+        print("    ", i, "\t", m, "\t", names[i])
 
 def cui_main():
     try:
         options, args = getopt.getopt(sys.argv[1:],
-                                      'hi:t:p:',
-                                      ['help', 'if=', 'type=', 'pattern='])
+                                      'hi:t:p:n:',
+                                      ['help', 'if=', 'type=', 'pattern=',
+                                       'threads='])
     except getopt.GetoptError:
         print("given options are not correct.")
         sys.exit(-1)
@@ -705,26 +1103,28 @@ def cui_main():
         elif o == "-t" or o == "--type": check_type(board_type, a); continue
         # Specifying match patterns of MAC address
         elif o == "-p" or o == "--pattern": pattern.append(a.lower()); continue
+        # Specifying number of ping threads
+        elif o == "-n" or o == "--threads": check_threads(a); continue
         # Unknown
         else:
             print("Unknown option") # never come here
             sys.exit(-1)
     try:
         if len(host_ip) == 0: host_ip = get_interfaces()
+        # (label, pattern): all of them are found by one scan per I/F
+        targets = [(b, BOARD_MAC_PATTERNS[b]) for b in board_type]
         for b in board_type:
             print("Finding", b)
-            for ip in host_ip:
-                boards = BOARD_TYPES[b][2](ip)
-                print("")
-                print(len(boards), b, "found on", ip)
-                if len(boards) != 0:
-                    print_boards(boards)
-        for p in pattern:
+        for p in dict.fromkeys(pattern): # dedupe keeping order
+            targets.append(("boards", p))
             print("Finding IPs with MAC address: ", p)
-            for ip in host_ip:
-                boards = get_mac_matched_ip(ip, p)
+        if len(targets) == 0: return 0
+        for ip in host_ip:
+            found = get_mac_matched_ip_multi(ip, [p for l, p in targets])
+            for label, p in targets:
+                boards = found[p]
                 print("")
-                print(len(boards), "boards found on", ip)
+                print(len(boards), label, "found on", ip)
                 if len(boards) != 0:
                     print_boards(boards)
         return 0
@@ -739,62 +1139,75 @@ import tkinter.ttk as ttk  # Python31+
 import tkinter as Tk
 from tkinter.font import Font as tkFont
 
-class AsyncInvoker(Thread):
-    def __init__(self, func):
-        Thread.__init__(self)
-        self.func = func
-    def run(self):
-        self.func()
+# Worker threads shared by the GUI: scans, host name lookups, launchers
+_POOL = ThreadPoolExecutor(max_workers = 64, thread_name_prefix = 'xfinder')
+
+def submit_async(func, *args, **kwargs):
+    future = _POOL.submit(func, *args, **kwargs)
+    future.add_done_callback(report_async_error)
+    return future
+
+# nobody waits for the futures: exceptions are printed as Thread did
+def report_async_error(future):
+    if future.cancelled() or future.exception() == None:
+        return
+    e = future.exception()
+    sys.stderr.write("Unexpected error in worker thread:\n")
+    traceback.print_exception(type(e), e, e.__traceback__)
 
 #------------------------------------------------------------
 # Terminal launcher
+# Directories where terminal applications are searched
+_WIN_BIN = [os.environ[e].replace('\\', '/')
+            for e in ("PROGRAMFILES", "PROGRAMFILES(x86)", "PROGRAMW6432")
+            if os.environ.get(e) != None]
+_UNIX_BIN = ["/usr/bin", "/usr/X11R6/bin",
+             "/usr/local/bin", "/bin",
+             "/opt/bin", "/opt/local/bin",
+             "/sbin", "/usr/sbin"]
+_MACOS_BIN = ["/usr/bin", "/usr/sbin",
+              "/usr/local/bin", "/usr/local/sbin",
+              "/Applications/",
+              "/Applications/Utilities/",
+              "/System/Applications/",
+              "/System/Applications/Utilities"]
+_BIN_PATHS = {'Windows': _WIN_BIN, 'Darwin': _MACOS_BIN, 'Linux': _UNIX_BIN}
+
+# Entry names in a directory (cached: launchers share directories)
+@functools.lru_cache(maxsize = None)
+def _list_dir(path):
+    try:
+        with os.scandir(path) as entries:
+            # normcase: case insensitive on Windows as os.path.exists
+            return frozenset([os.path.normcase(e.name) for e in entries])
+    except OSError:
+        return frozenset()
+
 class Launcher:
+    systems = () # platform.system() names the launcher runs on
     def __init__(self, cmd, appdir, path = None):
-        self.win_bin  = []
-        tmp = ("PROGRAMFILES", "PROGRAMFILES(x86)", "PROGRAMW6432")
-        for e in tmp:
-            import os
-            env = os.environ.get(e)
-            if env != None:
-                self.win_bin.append(env.replace('\\', '/'))
-        self.unix_bin = ["/usr/bin", "/usr/X11R6/bin",
-                  "/usr/local/bin", "/bin",
-                  "/opt/bin", "/opt/local/bin",
-                  "/sbin", "/usr/sbin"]
-        self.macos_bin = ["/usr/bin", "/usr/sbin",
-                    "/usr/local/bin", "/usr/local/sbin",
-                    "/Applications/",
-                    "/Applications/Utilities/",
-                    "/System/Applications/",
-                    "/System/Applications/Utilities"]
-        if path != None:
-            self.win_bin.append(path)
-            self.unix_bin.append(path)
-            self.macos_bin.append(path)
         self.cmd = cmd
         self.appdir = appdir
         self.path = path
         self.cmd_path = None
+        self.temp_files = []
         self.check_availability()
-    def __del__(self):
-        self.finalize()
+        # launchers are cached by get_term(): created files are removed at exit
+        atexit.register(self.finalize)
 
     def check_availability(self):
-        import platform
-        dprint("check_availability => system(): " + platform.system() + '\n')
-        if   platform.system() == 'Windows':
-            bin_path = self.win_bin
-        elif platform.system() == 'Darwin':
-            bin_path = self.macos_bin
-        elif platform.system() == 'Linux':
-            bin_path = self.unix_bin
-        else: # other OS
+        dprint("check_availability => system(): " + _SYSTEM + '\n')
+        bin_path = _BIN_PATHS.get(_SYSTEM)
+        if bin_path == None: # other OS
             sys.stderr.write("Unsupported OS\n")
+            return None
+        if self.path != None:
+            bin_path = bin_path + [self.path]
         dprint("bin_path: " + '\n'.join(bin_path) + '\n')
         for p in bin_path:
-            path = p + '/' + self.appdir + '/' + self.cmd
-            if os.path.exists(path):
-                self.cmd_path = path
+            appdir = p + '/' + self.appdir
+            if os.path.normcase(self.cmd) in _list_dir(appdir):
+                self.cmd_path = appdir + '/' + self.cmd
                 dprint(self.cmd + "is available")
                 return True
         dprint(self.cmd + "not available")
@@ -815,16 +1228,32 @@ class Launcher:
         self.user = user
         self.passwd = passwd
         self.port = port
-        self.th = AsyncInvoker(self.invoke_cmd)
-        self.th.start()
+        self.th = submit_async(self.invoke_cmd)
+
+    # creating a file on TEMP dir readable only by the user (it includes
+    # the password). It is removed by finalize().
+    def create_temp_file(self, data, prefix, suffix, temp_dir, mode = None):
+        if os.environ.get("TEMP") != None: temp_dir = os.environ["TEMP"]
+        fd, path = tempfile.mkstemp(prefix = prefix, suffix = suffix,
+                                    dir = temp_dir)
+        self.temp_files.append(path)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        if mode != None: os.chmod(path, mode)
+        return path
 
     def finalize(self):
-        pass
+        while self.temp_files:
+            try:
+                os.remove(self.temp_files.pop())
+            except OSError: # already removed
+                pass
 
 #------------------------------------------------------------
 # Teraterm launcher
 #------------------------------------------------------------
 class TeraTerm(Launcher):
+    systems = ('Windows',)
     def __init__(self, cmd = "ttermpro.exe", appdir = "TeraTerm", path = None):
         Launcher.__init__(self, cmd, appdir, path)
 
@@ -834,30 +1263,20 @@ class TeraTerm(Launcher):
                     '/user='+self.user,
                     '/passwd='+self.passwd]
         dprint("TeraTerm CMD: " + ' '.join(cmd_array) + "\n")
-        Popen(cmd_array, shell = True, **popen_args())
+        Popen(cmd_array, shell = False, **launcher_popen_args())
 
 #------------------------------------------------------------
-# Linux's generic Terminal App launcher
+# Login scripts: % (port, user, host, passwd) / (passwd, port, user, host)
 #------------------------------------------------------------
-class LinuxTerminal(Launcher):
-    def __init__(self, cmd = "xterm", options = "", appdir = "", path = None):
-        Launcher.__init__(self, cmd, appdir, path)
-        self.login_sh_file = None
-        self.options = options
-
-    def invoke_cmd(self):
-        # expect script for Terminal.app
-        if os.path.exists("/usr/bin/expect"):
-            login_sh = """#!/usr/bin/expect
+_EXPECT_TEMPLATE = b"""#!/usr/bin/expect
 spawn ssh -p %s %s@%s
 match_max 100000
 expect "*?assword:*"
 send -- "%s\r"
 send -- "\r"
 interact
-""" % (self.port, self.user, self.host, self.passwd)
-        else:
-            login_sh = """#!/bin/bash
+"""
+_NOEXPECT_TEMPLATE = b"""#!/bin/bash
 
 echo "'expect' command not found"
 echo "To omit the password input, install expect command."
@@ -865,28 +1284,43 @@ echo "Ubuntu/Debian: apt install expect"
 echo ""
 echo "Plase input password: %s"
 ssh -p %s %s@%s
-""" % (self.passwd, self.port, self.user, self.host)
+"""
+
+#------------------------------------------------------------
+# Linux's generic Terminal App launcher
+#------------------------------------------------------------
+class LinuxTerminal(Launcher):
+    systems = ('Linux',)
+    def __init__(self, cmd = "xterm", options = "", appdir = "", path = None):
+        Launcher.__init__(self, cmd, appdir, path)
+        self.login_sh_file = None
+        self.options = options
+
+    def invoke_cmd(self):
+        # expect script for Terminal.app
+        if os.path.exists("/usr/bin/expect"):
+            login_sh = _EXPECT_TEMPLATE % (self.port.encode(),
+                                           self.user.encode(),
+                                           self.host.encode(),
+                                           self.passwd.encode())
+        else:
+            login_sh = _NOEXPECT_TEMPLATE % (self.passwd.encode(),
+                                             self.port.encode(),
+                                             self.user.encode(),
+                                             self.host.encode())
 
         dprint("login shell script for " + self.cmd + "\n")
-        dprint(login_sh + "\n")
+        dprint(login_sh.decode() + "\n")
 
         # creating login script on TEMP dir
-        temp_dir = os.environ.get("TEMP")
-        if temp_dir == None: temp_dir = "/tmp"
-        self.login_sh_file = temp_dir + "/login_" + self.host + ".sh"
-        fd = open(self.login_sh_file, "w")
-        fd.write(login_sh)
-        fd.close()
+        self.login_sh_file = self.create_temp_file(login_sh,
+                                                   "login_" + self.host + "_",
+                                                   ".sh", "/tmp", stat.S_IRWXU)
         dprint("Login script created: " + self.login_sh_file + "\n")
-        os.system("chmod 755 " + self.login_sh_file)
         # launch Terminal.app
-        cmd = self.cmd + " " + self.options + " " + self.login_sh_file
-        Popen(cmd, shell = True,  **popen_args())
-        dprint(cmd + '\n')
-
-    def finalize(self):
-        if self.login_sh_file:
-            os.remove(self.login_sh_file)
+        cmd = [self.cmd_path] + self.options.split() + [self.login_sh_file]
+        Popen(cmd, shell = False, **launcher_popen_args())
+        dprint(' '.join(cmd) + '\n')
 
 #------------------------------------------------------------
 # Gnome terminal launcher
@@ -907,6 +1341,7 @@ class Kterm(LinuxTerminal):
 # Poderosa launcher
 #------------------------------------------------------------
 class Poderosa(Launcher):
+    systems = ('Windows',)
     def __init__(self, cmd = "poderosa.exe", appdir = "Poderosa Terminal 5",
                 path = None):
         Launcher.__init__(self, cmd, appdir, path)
@@ -922,72 +1357,54 @@ class Poderosa(Launcher):
                                         passphrase=\"%s\" />
 </poderosa-shortcut>""" % (self.host, self.host, self.port,
                            self.user, self.passwd)
-        temp_dir = os.environ.get("TEMP")
-        if temp_dir == None: temp_dir = "C:/"
-        self.gts_file = temp_dir + "/" + self.host + ".gts"
+        self.gts_file = self.create_temp_file(
+            gts.encode("shift_jis", "xmlcharrefreplace"),
+            self.host + "_", ".gts", "C:/")
         dprint("Poderosa's gts file: " + self.gts_file + "\n")
-        fd = open(self.gts_file, "w")
-        fd.write(gts)
-        fd.close()
-        cmd_str = "\"%s\" -open \"%s\"" % (self.cmd_path, self.gts_file)
-        dprint("Poderosa CMD: " + cmd_str + "\n")
-        Popen(cmd_str, shell = True, **popen_args())
-
-    def finalize(self):
-        if self.gts_file:
-            os.remove(self.gts_file)
+        cmd_array = [self.cmd_path, "-open", self.gts_file]
+        dprint("Poderosa CMD: " + ' '.join(cmd_array) + "\n")
+        Popen(cmd_array, shell = False, **launcher_popen_args())
 
 #------------------------------------------------------------
 # Putter launcher
 #------------------------------------------------------------
 class PuTTY(Launcher):
+    systems = ('Windows',)
     def __init__(self, cmd = "putty.exe", appdir = "PuTTY", path = None):
         Launcher.__init__(self, cmd, appdir, path)
 
     def invoke_cmd(self):
-        cmd_str = "\"%s\" -ssh %s@%s:%s -pw \"%s\"" \
-        % (self.cmd_path, self.user, self.host, self.port, self.passwd)
-        dprint("Putty CMD: " + cmd_str + "\n")
-        Popen(cmd_str, shell = True,  **popen_args())
+        cmd_array = [self.cmd_path,
+                    "-ssh", self.user + '@' + self.host + ':' + self.port,
+                    "-pw", self.passwd]
+        dprint("Putty CMD: " + ' '.join(cmd_array) + "\n")
+        Popen(cmd_array, shell = False, **launcher_popen_args())
 
 #------------------------------------------------------------
 # Mac's generic Terminal App launcher
 #------------------------------------------------------------
 class MacTermApp(Launcher):
+    systems = ('Darwin',)
     def __init__(self, cmd = "Terminal.app", appdir = "", path = None):
         Launcher.__init__(self, cmd, appdir, path)
         self.login_sh_file = None
 
     def invoke_cmd(self):
         # expect script for Terminal.app
-        login_sh = """#!/usr/bin/expect
-spawn ssh -p %s %s@%s
-match_max 100000
-expect "*?assword:*"
-send -- "%s\r"
-send -- "\r"
-interact
-""" % (self.port, self.user, self.host, self.passwd)
+        login_sh = _EXPECT_TEMPLATE % (self.port.encode(), self.user.encode(),
+                                       self.host.encode(), self.passwd.encode())
         dprint("login shell script for Terminal.app\n")
-        dprint(login_sh + "\n")
+        dprint(login_sh.decode() + "\n")
 
         # creating login script on TEMP dir
-        temp_dir = os.environ.get("TEMP")
-        if temp_dir == None: temp_dir = "/tmp"
-        self.login_sh_file = temp_dir + "/login_" + self.host + ".sh"
-        fd = open(self.login_sh_file, "w")
-        fd.write(login_sh)
-        fd.close()
+        self.login_sh_file = self.create_temp_file(login_sh,
+                                                   "login_" + self.host + "_",
+                                                   ".sh", "/tmp", stat.S_IRWXU)
         dprint("Login script created: " + self.login_sh_file + "\n")
-        os.system("chmod 755 " + self.login_sh_file)
         # launch Terminal.app
-        cmd = "/usr/bin/open -n -a " + self.cmd + " " + self.login_sh_file
-        Popen(cmd, shell = True,  **popen_args())
-        dprint(cmd + '\n')
-
-    def finalize(self):
-        if self.login_sh_file:
-            os.remove(self.login_sh_file)
+        cmd = ["/usr/bin/open", "-n", "-a", self.cmd, self.login_sh_file]
+        Popen(cmd, shell = False, **launcher_popen_args())
+        dprint(' '.join(cmd) + '\n')
 
 #------------------------------------------------------------
 # Mac's default Terminal.app launcher
@@ -1003,16 +1420,21 @@ class iTermApp(MacTermApp):
     def __init__(self, cmd = "iTerm.app", appdir = "", path = None):
         MacTermApp.__init__(self, cmd, appdir, path)
 
-TERM_TYPES = {
-    "gnome-terminal": GnomeTerminal(),
-    "xterm":          Xterm(),
-    "kterm":          Kterm(),
-    "TeraTerm":       TeraTerm(),
-    "Poderosa":       Poderosa(),
-    "PuTTY"   :       PuTTY(),
-    "Terminal.app":   TerminalApp(),
-    "iTerm.app":      iTermApp()
-    }
+# Launcher classes of this platform, instantiated on demand by get_term()
+TERM_TYPES_FACTORIES = dict((name, factory) for name, factory in (
+    ("gnome-terminal", GnomeTerminal),
+    ("xterm",          Xterm),
+    ("kterm",          Kterm),
+    ("TeraTerm",       TeraTerm),
+    ("Poderosa",       Poderosa),
+    ("PuTTY"   ,       PuTTY),
+    ("Terminal.app",   TerminalApp),
+    ("iTerm.app",      iTermApp)
+    ) if _SYSTEM in factory.systems)
+
+@functools.lru_cache(maxsize = None)
+def get_term(name):
+    return TERM_TYPES_FACTORIES[name]()
 
 # end of Terminal Launcher
 #------------------------------------------------------------
@@ -1025,13 +1447,27 @@ class App(ttk.Frame):
         # Member variables
         self.ifaddrs = []
         self.pattern = Tk.StringVar(value = "b8:27:eb:[a-f0-9:]*")
+        self.compile_pattern()
+        self.pattern.trace_add("write", self.compile_pattern)
         self.board_types = []
+        self._board_type_names = tuple(BOARD_TYPES.keys())
+        self._cached_ifaddrs = None
+        self._term_types = self.get_avail_term_types()
         self.sort_dir = True
         self.scan_type = Tk.StringVar(value = "board")
+        self._scan_dispatch = {"board":   self.scan_by_boardtype,
+                               "pattern": self.scan_by_pattern}
+        self.numthreads = Tk.IntVar(value = Pinger.numthreads)
         self.scanning_on = ""
         self.scanning = False
+        self.scanned = False       # scan on self.scanning_on returned
+        self.progress_done = Event() # progress bar reached the end
         self.tselected = None
         self.login_infos = ("User name", "Password", "Port")
+        self._measure_font = tkFont(self.master, font = ('*', 12))
+        self._rows = {}          # iid: (ip, mac, host name)
+        self._pending_rdns = {}  # iid: ip of the rows without host name
+        self._rdns_check = None
 
         # GUi style configuration
         sty = ttk.Style()
@@ -1062,11 +1498,17 @@ class App(ttk.Frame):
         self.w_fright = Tk.LabelFrame(self.master, text = "Found nodes")
         self.w_fright.pack(pady = 10, padx = 10, fill = Tk.Y, side = Tk.LEFT)
         self.create_right(self.w_fright)
+        # found nodes and GUI updates are queued by worker threads and
+        # processed here: Tk is called only from the main thread
+        self._row_queue = Queue()
+        self._main_queue = Queue()
+        self.after(50, self._drain_rows)
 
     def create_left_top(self, w):
         self.create_ifaddr_combo(w)
         self.create_type_combo(w)
         self.create_pattern_textbox(w)
+        self.create_threads_spinbox(w)
         self.create_scan_button(w)
         self.create_progressbar(w)
 
@@ -1084,10 +1526,11 @@ class App(ttk.Frame):
                                         width = self.label_width)
         self.w_ifaddr_label.grid(row = 0, column = 0, padx = 10, pady = 5,
                                  sticky = Tk.W + Tk.E)
-        iflist = ['ALL'] + get_interfaces()
+        iflist = ['ALL'] + self._all_ifaddrs()
         self.w_ifaddr = ttk.Combobox(w, values = iflist,
                                      width = self.entry_width,
-                                     state = 'readonly')
+                                     state = 'readonly',
+                                     postcommand = self.refresh_ifaddr)
         self.w_ifaddr.set('ALL')
         self.w_ifaddr.grid(row = 0, column = 1, padx = 10, pady = 5,
                            sticky = Tk.W + Tk.E)
@@ -1103,11 +1546,10 @@ class App(ttk.Frame):
         self.w_btype_radio.grid(row = 1, column = 0,
                                 padx = 10, pady = 5, sticky = Tk.W)
         # Combobox
-        types = list(BOARD_TYPES.keys())
-        self.w_btype = ttk.Combobox(w, values = types,
+        self.w_btype = ttk.Combobox(w, values = self._board_type_names,
                                     width = self.entry_width,
                                     state = 'readonly')
-        self.w_btype.set(list(BOARD_TYPES.keys())[0])
+        self.w_btype.set(self._board_type_names[0])
         self.w_btype.grid(row = 1, column = 1, padx = 10, pady = 5)
         self.w_btype.bind('<<ComboboxSelected>>', self.select_types)
 
@@ -1127,9 +1569,21 @@ class App(ttk.Frame):
                             sticky = Tk.W + Tk.E)
 
     # left top pane (4)
+    def create_threads_spinbox(self, w):
+        self.w_threads_label = ttk.Label(w, text = "Ping threads",
+                                         width = self.label_width)
+        self.w_threads_label.grid(row = 3, column = 0, padx = 10, pady = 5,
+                                  sticky = Tk.W + Tk.E)
+        self.w_threads = ttk.Spinbox(w, from_ = 1, to = 1024,
+                                     width = self.entry_width,
+                                     textvariable = self.numthreads)
+        self.w_threads.grid(row = 3, column = 1, padx = 10, pady = 5,
+                            sticky = Tk.W + Tk.E)
+
+    # left top pane (5)
     def create_scan_button(self, w0):
         w = ttk.Frame(w0)
-        w.grid(row = 3, column = 0, columnspan = 2, padx = 10, pady = 5)
+        w.grid(row = 4, column = 0, columnspan = 2, padx = 10, pady = 5)
         self.w_scan = Tk.Button(w, text = 'Scan',
                                 width = self.label_width - 1, height = 1,
                                 pady = 5, padx = 5,
@@ -1144,22 +1598,22 @@ class App(ttk.Frame):
                          sticky = Tk.W + Tk.E)
         self.w_abort["state"] = Tk.DISABLED
 
-    # left top pane (5)
+    # left top pane (6)
     def create_progressbar(self, w):
         self.w_progress = ttk.Progressbar(w,
                                           orient = "horizontal",
                                           mode = "determinate")
-        self.w_progress.grid(row = 4, column = 0, columnspan = 2,
+        self.w_progress.grid(row = 5, column = 0, columnspan = 2,
                              padx = 10, pady = 5, sticky = Tk.W + Tk.E)
         self.w_proglabel = ttk.Label(w, anchor = Tk.CENTER,
                                      justify = Tk.CENTER)
-        self.w_proglabel.grid(row = 5, column = 0, columnspan = 2,
+        self.w_proglabel.grid(row = 6, column = 0, columnspan = 2,
                              padx = 10, pady = 5, sticky = Tk.W + Tk.E)
 
     def get_avail_term_types(self):
         types = []
-        for ttype in TERM_TYPES.keys():
-            if TERM_TYPES[ttype].is_available():
+        for ttype in TERM_TYPES_FACTORIES.keys():
+            if get_term(ttype).is_available():
                 types.append(ttype)
         types.sort(); types.reverse()
         return types
@@ -1188,7 +1642,7 @@ class App(ttk.Frame):
         self.w_tlabel.grid(row = len(self.login_infos), column = 0,
                            pady = 5, padx = 10,
                            sticky = Tk.W + Tk.E)
-        types = self.get_avail_term_types()
+        types = self._term_types
         self.w_ttype = ttk.Combobox(w, values = types,
                                     width = self.entry_width,
                                     state = 'readonly')
@@ -1218,7 +1672,7 @@ class App(ttk.Frame):
         self.user = self.w_lentry["User name"].get()
         self.passwd = self.w_lentry["Password"].get()
         self.port = self.w_lentry["Port"].get()
-        TERM_TYPES[self.w_ttype.get()].launch(self.host, self.user, self.passwd,
+        get_term(self.w_ttype.get()).launch(self.host, self.user, self.passwd,
                                             self.port)
     # [callback] treeview
     def treeview_press(self, event = None):
@@ -1236,16 +1690,23 @@ class App(ttk.Frame):
     # right pane
     def create_node_list(self, w):
         self.dataCols = ('IP address', 'MAC address', 'Host name')
+        self._col_widths = {col: 150 for col in self.dataCols}
         self.tree = ttk.Treeview(w, columns = self.dataCols,
                                  selectmode = "browse",
                                  show = 'headings')
         self.tree.bind('<Button-1>', self.treeview_press)
         self.tree.bind('<ButtonRelease-1>', self.treeview_release)
         self.tree.bind('<Double-Button-1>', self.login)
+        # host names are looked up when the rows come into view
+        self.tree.bind('<Configure>', self.request_rdns)
+        self.tree.bind('<MouseWheel>', self.request_rdns)
 
         ysb = ttk.Scrollbar(orient = Tk.VERTICAL, command = self.tree.yview)
         xsb = ttk.Scrollbar(orient = Tk.HORIZONTAL, command = self.tree.xview)
-        self.tree['yscroll'] = ysb.set
+        def yscroll(first, last):
+            ysb.set(first, last)
+            self.request_rdns()
+        self.tree['yscroll'] = yscroll
         self.tree['xscroll'] = xsb.set
 
         # add tree and scrollbars to frame
@@ -1259,15 +1720,17 @@ class App(ttk.Frame):
 
         # sort function
         def treeview_sort_column(tree, col, reverse):
-            l = [(tree.set(k, col), k) for k in tree.get_children('')]
-            l.sort(reverse = reverse)
+            # IP address is sorted numerically, not as string
+            key = socket.inet_aton if col == self.dataCols[0] else str
+            l = sorted(((key(tree.set(k, col)), k)
+                        for k in tree.get_children('')), reverse = reverse)
             # rearrange items in sorted positions
             for index, (val, k) in enumerate(l):
                 tree.move(k, '', index)
-                # reverse sort next time
-                tree.heading(col,
-                           command = lambda col_ = col:
-                           treeview_sort_column(tree, col_, not reverse))
+            # reverse sort next time
+            tree.heading(col,
+                         command = lambda col_ = col:
+                         treeview_sort_column(tree, col_, not reverse))
 
         for col in self.dataCols:
             self.tree.heading(col, text = col,
@@ -1275,11 +1738,25 @@ class App(ttk.Frame):
                               treeview_sort_column(self.tree, col_, False))
             self.tree.column(col, width = 150)
 
+    # interface addresses, enumerated again only after refresh_ifaddr()
+    def _all_ifaddrs(self):
+        if self._cached_ifaddrs == None:
+            self._cached_ifaddrs = get_interfaces()
+        return self._cached_ifaddrs
+
+    # [callback] Interface Combobox opened
+    def refresh_ifaddr(self):
+        # interfaces might be changed (DHCP, cable, etc.) in GUI session
+        get_interfaces.cache_clear()
+        get_netinfo.cache_clear()
+        self._cached_ifaddrs = None
+        self.w_ifaddr["values"] = ['ALL'] + self._all_ifaddrs()
+
     # [callback] Interface Combobox
     def select_ifaddr(self, event = None):
         value = self.w_ifaddr.get()
         if value == "ALL":
-            self.ifaddrs = get_interfaces()
+            self.ifaddrs = self._all_ifaddrs()
         else:
             self.ifaddrs = [value]
         if len(self.ifaddrs) == 0 or self.ifaddrs == None:
@@ -1289,7 +1766,7 @@ class App(ttk.Frame):
     def select_types(self, event = None):
         value = self.w_btype.get()
         if value == "ALL":
-            self.board_types = BOARD_TYPES.keys()
+            self.board_types = self._board_type_names
             self.lvar["User name"].set(BOARD_TYPES["Raspberry"][1]["login"])
             self.lvar["Password"].set(BOARD_TYPES["Raspberry"][1]["passwd"])
             self.lvar["Port"].set(BOARD_TYPES["Raspberry"][1]["port"])
@@ -1303,33 +1780,113 @@ class App(ttk.Frame):
         if len(self.board_types) == 0 or self.board_types == None:
             sys.stderr.write("No available board types.\n")
 
-    # setting host/mac/hostname in the treeview
-    def set_scan_data_item(self, ip_addr, mac_addr):
-        import socket
-        try:
-            host_name = socket.gethostbyaddr(ip_addr)[0]
-        except:
-            host_name = ""
-        row_data = (ip_addr, mac_addr, host_name)
-        self.tree.insert('', 'end', values = row_data)
-        for idx, val in enumerate(row_data):
-            tf = tkFont(root)
-            iwidth = tf.measure(text = val)
-            if self.tree.column(self.dataCols[idx], 'width') < iwidth:
-                self.tree.column(self.dataCols[idx], width = iwidth)
-
     # setting host/mac/hostname in the treeview
     def set_scan_data(self, addr_list):
-        for ip_addr, mac_addr in addr_list.items():
-            AsyncInvoker(lambda ip_addr_ = ip_addr, mac_addr_ = mac_addr, :
-                         self.set_scan_data_item(ip_addr_, mac_addr_)).start()
+        self._insert_rows([(ip, mac, "") for ip, mac in addr_list.items()])
+
+    # [scan thread] callback of a found node: no Tk call in this thread
+    def queue_scan_data(self, ip_addr, mac_addr):
+        self._row_queue.put((ip_addr, mac_addr))
+
+    # inserting the queued nodes at once, then the queued GUI updates
+    # (Tk main thread)
+    def _drain_rows(self):
+        self.after(50, self._drain_rows)
+        addr_list = {}
+        try:
+            while True:
+                ip_addr, mac_addr = self._row_queue.get_nowait()
+                addr_list[ip_addr] = mac_addr
+        except Empty:
+            pass
+        if addr_list:
+            self.set_scan_data(addr_list)
+        try:
+            while True:
+                func, args = self._main_queue.get_nowait()
+                func(*args)
+        except Empty:
+            pass
+
+    # [worker thread] func(*args) is called in the Tk main thread
+    def call_in_main(self, func, *args):
+        self._main_queue.put((func, args))
+
+    # inserting rows in the treeview (Tk main thread)
+    def _insert_rows(self, rows):
+        for row_data in rows:
+            iid = self.tree.insert('', 'end', values = row_data)
+            self._rows[iid] = row_data
+            self._pending_rdns[iid] = row_data[0]
+        if not self.scanning: # rows inserted after the scan
+            self._widen_columns(rows, False)
+        self.request_rdns()
+
+    # [callback] treeview scrolled/resized: looking up shown rows (once idle)
+    def request_rdns(self, event = None):
+        if self._rdns_check == None:
+            self._rdns_check = self.after_idle(self._resolve_visible)
+
+    # indexes of first/last row shown in the treeview (None: no row shown)
+    def _visible_range(self, children):
+        h = self.tree.winfo_height()
+        for y in range(0, h, 5): # skipping the heading
+            top = self.tree.identify_row(y)
+            if top: break
+        else:
+            return None
+        bottom = self.tree.identify_row(h - 5) # inside the border
+        if not bottom: # rows end above the bottom: all the rest are shown
+            return self.tree.index(top), len(children) - 1
+        return self.tree.index(top), self.tree.index(bottom)
+
+    def _resolve_visible(self):
+        self._rdns_check = None
+        if not self._pending_rdns: return
+        children = self.tree.get_children()
+        shown = self._visible_range(children)
+        if shown == None: return
+        for iid in children[shown[0]:shown[1] + 1]:
+            ip = self._pending_rdns.pop(iid, None)
+            if ip != None:
+                f = submit_async(get_hostname, ip)
+                f.add_done_callback(lambda f_, iid_ = iid:
+                                    self.call_in_main(self._set_hostname,
+                                                      iid_, f_.result()))
+
+    def _set_hostname(self, iid, host_name):
+        if host_name == "" or iid not in self._rows: # not found or cleared
+            return
+        ip_addr, mac_addr, _ = self._rows[iid]
+        self._rows[iid] = (ip_addr, mac_addr, host_name)
+        self.tree.set(iid, self.dataCols[2], host_name)
+        if not self.scanning:
+            self._widen_columns([self._rows[iid]], False)
+
+    # fitting the column widths to the rows, once after the scan
+    def _finalize_columns(self):
+        self._widen_columns(list(self._rows.values()), True)
+
+    # self._col_widths mirrors the widths not to query them from Tk
+    def _widen_columns(self, rows, shrink):
+        for idx, col in enumerate(self.dataCols):
+            w = max([self._measure_font.measure(r[idx]) for r in rows],
+                    default = 0)
+            w = max(w, 150) if shrink else max(w, self._col_widths[col])
+            if w != self._col_widths[col]:
+                self._col_widths[col] = w
+                self.tree.column(col, width = w)
 
     # cleanup treeview
     def clear_treeview(self):
         self.tree.delete(*self.tree.get_children())
+        self._rows = {}
+        self._pending_rdns = {}
 
-    # progress bar
-    def advance_progress(self):
+    # progress bar (Tk main thread, scheduled by watch_progress)
+    def _render_progress(self):
+        if self.progress_done.is_set(): # late render: result already shown
+            return
         pre_val = self.w_progress["value"]
         if PingAgent.max_count == 0:
             val = 100
@@ -1343,12 +1900,52 @@ class App(ttk.Frame):
         text += " " * ((3 - len(percent)) * 2)
         text += percent + "%"
         self.w_proglabel["text"] = text
-        if PingAgent.count < PingAgent.max_count:
+        if PingAgent.count < PingAgent.max_count or not self.scanned:
             if not self.scanning:
                 self.reverse_progress()
                 self.w_proglabel["text"] = "Aborting..."
-                return
-            self.after(20, self.advance_progress)
+                self.progress_done.set()
+        else:
+            self.progress_done.set()
+
+    # [worker thread] rendering progress only when PingAgent reports it
+    # until the whole scan (all the interfaces) is finished
+    def watch_progress(self, finished):
+        while not finished.is_set():
+            if PingAgent.progressed.wait(1.0):
+                PingAgent.progressed.clear()
+                self.call_in_main(self._render_progress)
+                time.sleep(0.02) # coalescing bursts of pings
+
+    # [worker thread] scan with one progress watcher
+    def run_scan(self, scan):
+        finished = Event() # per scan: a watcher never outlives its scan
+        submit_async(self.watch_progress, finished)
+        msg = "Done"
+        try:
+            msg = scan()
+        except Exception as e:
+            msg = "Scan failed: " + str(e)
+            raise # printed by report_async_error()
+        finally:
+            finished.set()
+            PingAgent.progressed.set()
+            # GUI gets back to ready state whatever happened
+            self.call_in_main(self._scan_finished, msg)
+
+    # starting progress bar of a scan on the interface
+    def start_progress(self, ip):
+        self.scanning_on = ip
+        self.scanned = False
+        self.progress_done.clear()
+        PingAgent.progressed.set()
+
+    # waiting for the progress bar to show the end of the scan
+    def finish_progress(self):
+        self.scanned = True
+        PingAgent.progressed.set()
+        self.progress_done.wait(1.0)
+        self.progress_done.set() # no more render until next start_progress()
 
     def reverse_progress(self):
         self.w_progress["value"] = self.w_progress["value"] - 0.5
@@ -1362,12 +1959,19 @@ class App(ttk.Frame):
         self.w_progress["value"] = 0
         self.clear_treeview()
         self.select_ifaddr()
-        self.scanning = True
-        # Scan by board type
         if self.scan_type.get() == "board":
-            AsyncInvoker(self.scan_by_boardtype).start()
-        elif self.scan_type.get() == "pattern":
-            AsyncInvoker(self.scan_by_pattern).start()
+            # board defaults are set to login info only by board scan
+            self.select_types()
+        try:
+            if self.numthreads.get() > 0:
+                Pinger.set_numthreads(self.numthreads.get())
+        except Tk.TclError: # not a number
+            self.numthreads.set(Pinger.numthreads)
+        self.scanning = True
+        # Scan by board type or MAC pattern
+        scan = self._scan_dispatch.get(self.scan_type.get())
+        if scan:
+            submit_async(self.run_scan, scan)
         else:
             print("Invalid scan type: ", self.scan_type.get())
 
@@ -1375,41 +1979,63 @@ class App(ttk.Frame):
         if self.scanning:
             Pinger.abort()
             self.scanning = False
+            PingAgent.progressed.set()
 
-    # scanning by board type
+    # showing the result of a scan on the interface (Tk main thread)
+    def _show_result(self, msg, clear_bar):
+        self.w_proglabel["text"] = msg
+        if clear_bar: self.w_progress["value"] = 0
+
+    # scan finished or cannot be started (Tk main thread)
+    def _scan_finished(self, msg):
+        self.w_proglabel["text"] = msg
+        self._finalize_columns()
+        self.w_scan["state"] = Tk.ACTIVE
+        self.w_abort["state"] = Tk.DISABLED
+        self.scanning = False
+
+    # scanning by board type (return: message shown at the end)
     def scan_by_boardtype(self):
-        self.select_types()
         for b in self.board_types:
             if not self.scanning: break
             for ip in self.ifaddrs:
                 if not self.scanning: break
-                self.scanning_on = ip
-                self.after(100, self.advance_progress)
-                boards = BOARD_TYPES[b][2](ip, self.set_scan_data_item)
-                msg = str(len(boards)) + " " + b + " found on " + ip
-                self.w_proglabel["text"] = msg
-                self.w_progress["value"] = 0
-                time.sleep(2)
-        self.w_proglabel["text"] = "Done"
-        self.w_scan["state"] = Tk.ACTIVE
-        self.w_abort["state"] = Tk.DISABLED
-        self.scanning = False
+                self.start_progress(ip)
+                try:
+                    boards = BOARD_TYPES[b][2](ip, self.queue_scan_data)
+                    msg = str(len(boards)) + " " + b + " found on " + ip
+                except ValueError as e:
+                    msg = "Cannot scan on " + ip + ": " + str(e)
+                self.finish_progress()
+                self.call_in_main(self._show_result, msg, True)
+        return "Done"
+
+    # [callback] pattern Entry changed: compiled once per edit, not per scan
+    def compile_pattern(self, *args):
+        try:
+            self._pat_re = compile_mac_pattern(self.pattern.get())
+            self._pat_error = None
+        except re.error as e:
+            self._pat_re = None
+            self._pat_error = str(e)
 
-    # scanning by MAC pattern
+    # scanning by MAC pattern (return: message shown at the end)
     def scan_by_pattern(self):
+        pattern = self._pat_re
+        if pattern == None:
+            return "Invalid pattern: " + self._pat_error
         for ip in self.ifaddrs:
             if not self.scanning: break
-            self.scanning_on = ip
-            self.after(100, self.advance_progress)
-            boards = get_mac_matched_ip(ip, self.pattern.get(),
-                                        self.set_scan_data_item)
-            msg = str(len(boards)) + " boards found on " + ip
-            self.w_proglabel["text"] = msg
-            time.sleep(2)
-        self.w_proglabel["text"] = "Done"
-        self.w_scan["state"] = Tk.ACTIVE
-        self.w_abort["state"] = Tk.DISABLED
-        self.scanning = False
+            self.start_progress(ip)
+            try:
+                boards = get_mac_matched_ip(ip, pattern,
+                                            self.queue_scan_data)
+                msg = str(len(boards)) + " boards found on " + ip
+            except ValueError as e:
+                msg = "Cannot scan on " + ip + ": " + str(e)
+            self.finish_progress()
+            self.call_in_main(self._show_result, msg, False)
+        return "Done"
 
 #------------------------------------------------------------
 # GUI main function
@@ -1429,14 +2055,14 @@ def resource_path(relative):
 def gui_main():
     global root
     import signal
+    app = None
     try:
         PingAgent.verbose(False)
         signal.signal(signal.SIGINT, sigint_handler)
         signal.signal(signal.SIGTERM, sigint_handler)
         root =Tk.Tk()
-        App(root)
+        app = App(root)
         root.title("xfinder")
-        import platform
         pf = platform.system()
         dprint("Platform type is: " + pf)
         if pf == "Linux":
@@ -1454,6 +2080,10 @@ def gui_main():
         print("Unexpected error in gui_main():",
             sys.exc_info()[0])
         raise
+    finally:
+        # a running scan would keep the process alive until it ends
+        if app: app.do_abort()
+        _POOL.shutdown(wait = False, cancel_futures = True)
     sys.exit(0)
 
 #------------------------------------------------------------